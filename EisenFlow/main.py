@@ -1,18 +1,22 @@
 import sys
 import uuid
 import os
+import json
 import logging
+import heapq
+import calendar
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QGridLayout,
     QLabel, QPushButton, QDialog, QFormLayout, QLineEdit, QComboBox,
     QMessageBox, QListWidget, QListWidgetItem, QFrame, QHBoxLayout,
-    QGraphicsDropShadowEffect, QScrollArea, QMenu
+    QGraphicsDropShadowEffect, QScrollArea, QMenu, QCheckBox, QDateTimeEdit
 )
 from PySide6.QtCore import (
-    Qt, QMimeData, Signal, QObject, QPropertyAnimation, QEasingCurve
+    Qt, QMimeData, Signal, QObject, QPropertyAnimation, QEasingCurve, QTimer, QDateTime
 )
 from PySide6.QtGui import (
     QPalette, QColor, QDrag, QPixmap, QFont, QPainter, QCursor
@@ -30,6 +34,17 @@ logging.basicConfig(level=logging.INFO)
 USERS_DIR = Path.home() / ".eisenflow_users"
 USERS_DIR.mkdir(exist_ok=True)
 
+STATUSES = ["To Do", "In Progress", "Done"]
+
+# Done tasks are always moved to the archive. Set a number of days here to
+# also archive tasks that have been sitting on the board longer than that.
+ARCHIVE_AFTER_DAYS: Optional[int] = None
+ARCHIVE_PAGE_SIZE = 50
+
+# Tasks with a due date are moved into Q1 once they are this close to it.
+AUTO_PROMOTE_TO_Q1 = True
+URGENT_WINDOW = timedelta(hours=24)
+
 def derive_db_key(password: str, salt: bytes) -> bytes:
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
@@ -39,6 +54,54 @@ def derive_db_key(password: str, salt: bytes) -> bytes:
     )
     return kdf.derive(password.encode('utf-8'))
 
+# -------------------- Connection Profile --------------------
+# Written by profile_benchmark.py; new databases use it when present.
+DEFAULT_PROFILE_FILE = USERS_DIR / "profile_defaults.json"
+
+class ConnectionProfile:
+    """SQLCipher settings for one database.
+
+    page_size, hmac_algorithm and use_hmac are fixed in the file format, so
+    changing them on an existing database needs migrate_profile(). The rest
+    are applied on every connect and can be changed freely.
+    """
+    def __init__(self, page_size: int = 4096, cache_size: int = -2000,
+                 temp_store: str = "MEMORY", memory_security: bool = False,
+                 hmac_algorithm: str = "HMAC_SHA512", use_hmac: bool = True):
+        self.page_size = page_size
+        self.cache_size = cache_size  # negative values are KiB, as in PRAGMA cache_size
+        self.temp_store = temp_store
+        self.memory_security = memory_security
+        self.hmac_algorithm = hmac_algorithm
+        self.use_hmac = use_hmac
+
+    @classmethod
+    def from_file(cls, path: Path) -> "ConnectionProfile":
+        return cls(**json.loads(path.read_text(encoding="utf-8")))
+
+    def save(self, path: Path):
+        path.write_text(json.dumps(vars(self), indent=2), encoding="utf-8")
+
+    def apply_format(self, conn, schema: str = "main"):
+        # Must run after PRAGMA key and before the database is first read
+        conn.execute(f"PRAGMA {schema}.cipher_page_size = {int(self.page_size)}")
+        conn.execute(f"PRAGMA {schema}.cipher_hmac_algorithm = {self.hmac_algorithm}")
+        conn.execute(f"PRAGMA {schema}.cipher_use_hmac = {'ON' if self.use_hmac else 'OFF'}")
+
+    def apply(self, conn):
+        self.apply_format(conn)
+        conn.execute(f"PRAGMA cipher_memory_security = {'ON' if self.memory_security else 'OFF'}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+
+def default_profile() -> ConnectionProfile:
+    if DEFAULT_PROFILE_FILE.exists():
+        try:
+            return ConnectionProfile.from_file(DEFAULT_PROFILE_FILE)
+        except Exception as e:
+            logging.warning(f"Ignoring invalid default profile: {e}")
+    return ConnectionProfile()
+
 # -------------------- Communication --------------------
 class Signals(QObject):
     tasks_changed = Signal()
@@ -48,24 +111,126 @@ signals = Signals()
 # -------------------- Model --------------------
 class Task:
     def __init__(self, title: str, description: str = "", quadrant: str = "Q1",
-                 status: str = "To Do", task_id: Optional[uuid.UUID] = None):
+                 status: str = "To Do", task_id: Optional[uuid.UUID] = None,
+                 created_at: Optional[datetime] = None, due_at: Optional[datetime] = None,
+                 reminded: bool = False, promoted: bool = False, rule_id: Optional[uuid.UUID] = None):
         self.id = task_id or uuid.uuid4()
         self.title = title.strip()
         self.description = description.strip()
         self.quadrant = quadrant
         self.status = status
+        self.created_at = created_at or datetime.now().replace(microsecond=0)
+        self.due_at = due_at
+        self.reminded = reminded
+        # Set once the task has been moved into Q1, or when promotion was waived
+        self.promoted = promoted
+        self.rule_id = rule_id
+
+    def set_due(self, due_at: Optional[datetime]):
+        """Change the deadline, giving it its own reminder and promotion."""
+        self.due_at = due_at
+        self.reminded = False
+        # A deadline that is already urgent when set leaves the chosen quadrant alone
+        self.promoted = due_at is not None and due_at - URGENT_WINDOW <= datetime.now()
+
+    def move_to(self, quadrant: str):
+        """Place the task by hand; taking it out of Q1 stops it being promoted back."""
+        if self.quadrant == "Q1" and quadrant != "Q1":
+            self.promoted = True
+        self.quadrant = quadrant
+
+class RecurrenceRule:
+    """A repeating task stored once; only its next occurrence exists as a task row."""
+    FREQUENCIES = {"daily": "روزانه", "weekly": "هفتگی", "monthly": "ماهانه"}
+
+    def __init__(self, title: str, description: str, quadrant: str, frequency: str,
+                 start_at: datetime, interval: int = 1, rule_id: Optional[uuid.UUID] = None):
+        self.id = rule_id or uuid.uuid4()
+        self.title = title.strip()
+        self.description = description.strip()
+        self.quadrant = quadrant
+        self.frequency = frequency
+        self.start_at = start_at
+        self.interval = interval
+
+    def _nth(self, k: int) -> datetime:
+        if self.frequency == "monthly":
+            # Always count from start_at so the 31st comes back after a short month
+            months = self.start_at.month - 1 + k * self.interval
+            year = self.start_at.year + months // 12
+            month = months % 12 + 1
+            day = min(self.start_at.day, calendar.monthrange(year, month)[1])
+            return self.start_at.replace(year=year, month=month, day=day)
+        step = timedelta(days=1 if self.frequency == "daily" else 7)
+        return self.start_at + step * (k * self.interval)
+
+    def occurrences(self, after: Optional[datetime] = None) -> Iterator[datetime]:
+        """Yield occurrences later than `after`, jumping straight to the first one."""
+        k = 0
+        if after is not None and after >= self.start_at:
+            if self.frequency == "monthly":
+                elapsed = (after.year - self.start_at.year) * 12 + after.month - self.start_at.month
+            else:
+                elapsed = (after - self.start_at) // timedelta(days=1 if self.frequency == "daily" else 7)
+            k = elapsed // self.interval
+        while True:
+            when = self._nth(k)
+            if after is None or when > after:
+                yield when
+            k += 1
+
+    def next_task(self, after: Optional[datetime] = None) -> Task:
+        # Generated occurrences are promoted normally once they become urgent
+        return Task(self.title, self.description, self.quadrant,
+                    due_at=next(self.occurrences(after)), rule_id=self.id)
+
+class DatabaseInUseError(RuntimeError):
+    pass
 
 class TaskManager:
+    COLUMNS = "id, title, description, quadrant, status, created_at, due_at, reminded, promoted, rule_id"
+    RULE_COLUMNS = "id, title, description, quadrant, frequency, interval, start_at"
+
     def __init__(self, username: str, password: str):
         self.username = username
         self.db_path = USERS_DIR / f"{username}.db"
-        self.salt = self._get_or_create_salt()
-        self.db_key = derive_db_key(password, self.salt)
+        self.profile_path = USERS_DIR / f"{username}_profile.json"
+        # Staging files for migrate_profile(); both exist only while a migration is in flight
+        self.migrating_db_path = USERS_DIR / f"{username}.migrating.db"
+        self.pending_profile_path = USERS_DIR / f"{username}_profile.pending.json"
+        self.lock_path = USERS_DIR / f"{username}.lock"
+        self.lock_file = None
         self.conn = None
-        self._connect()
-        self._create_table()
+        self._acquire_lock()
+        try:
+            self.salt = self._get_or_create_salt()
+            self._recover_migration()
+            self.profile = self._get_or_create_profile()
+            self.db_key = derive_db_key(password, self.salt)
+            self._connect()
+            self._create_table()
+        except Exception:
+            self.close()
+            raise
         del password
 
+    def _acquire_lock(self):
+        # Held for the lifetime of the TaskManager so a second one, e.g. a
+        # profile migration while the app is open, can't swap the file under it.
+        # The OS drops the lock if the process dies, so it never goes stale.
+        self.lock_file = open(self.lock_path, "w")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock_file.close()
+            self.lock_file = None
+            raise DatabaseInUseError(f"Database for '{self.username}' is already open")
+
     def _get_or_create_salt(self) -> bytes:
         salt_file = USERS_DIR / f"{self.username}_salt.bin"
         if salt_file.exists():
@@ -74,13 +239,34 @@ class TaskManager:
         salt_file.write_bytes(salt)
         return salt
 
+    def _recover_migration(self):
+        # The pending profile is written only once the export is complete, and the
+        # exported database is swapped in before the profile, so these two files
+        # tell exactly how far an interrupted migration got.
+        if self.pending_profile_path.exists():
+            if self.migrating_db_path.exists():
+                logging.warning("Discarding interrupted profile migration")
+                self.pending_profile_path.unlink()
+            else:
+                logging.warning("Completing interrupted profile migration")
+                os.replace(self.pending_profile_path, self.profile_path)
+        self.migrating_db_path.unlink(missing_ok=True)
+
+    def _get_or_create_profile(self) -> ConnectionProfile:
+        if self.profile_path.exists():
+            return ConnectionProfile.from_file(self.profile_path)
+        # Databases created before profiles existed use the original format
+        profile = ConnectionProfile() if self.db_path.exists() else default_profile()
+        profile.save(self.profile_path)
+        return profile
+
     def _connect(self):
         try:
             self.conn = sqlite.connect(str(self.db_path))
             key_hex = self.db_key.hex()
+            # The key is raw, so SQLCipher skips its KDF and kdf_iter has no effect
             self.conn.execute(f"PRAGMA key = \"x'{key_hex}'\"")
-            self.conn.execute("PRAGMA kdf_iter = 256000")
-            self.conn.execute("PRAGMA cipher_page_size = 4096")
+            self.profile.apply(self.conn)
             self.conn.execute("PRAGMA foreign_keys = ON")
             del self.db_key
             del key_hex
@@ -91,25 +277,83 @@ class TaskManager:
     def close(self):
         if self.conn:
             self.conn.close()
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
 
     def _create_table(self):
         with self.conn:
+            # tasks_archive mirrors tasks so rows can move between them in bulk
+            for table in ("tasks", "tasks_archive"):
+                self.conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id TEXT PRIMARY KEY,
+                        title TEXT NOT NULL,
+                        description TEXT,
+                        quadrant TEXT NOT NULL,
+                        status TEXT NOT NULL
+                    )
+                """)
+                self._add_missing_columns(table, {
+                    "created_at": "TEXT",
+                    "due_at": "TEXT",
+                    "reminded": "INTEGER NOT NULL DEFAULT 0",
+                    "promoted": "INTEGER NOT NULL DEFAULT 0",
+                    "rule_id": "TEXT",
+                })
+            self._add_missing_columns("tasks_archive", {"archived_at": "TEXT"})
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_quadrant ON tasks (quadrant)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_at ON tasks (due_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_rule_id ON tasks (rule_id)")
             self.conn.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
+                CREATE TABLE IF NOT EXISTS recurrence_rules (
                     id TEXT PRIMARY KEY,
                     title TEXT NOT NULL,
                     description TEXT,
                     quadrant TEXT NOT NULL,
-                    status TEXT NOT NULL
+                    frequency TEXT NOT NULL,
+                    interval INTEGER NOT NULL DEFAULT 1,
+                    start_at TEXT NOT NULL
                 )
             """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_archived_at ON tasks_archive (archived_at)")
+
+    def _add_missing_columns(self, table: str, columns: dict):
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns.items():
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+                if name == "created_at":
+                    # Rows from before this column existed count as created now
+                    self.conn.execute(f"UPDATE {table} SET created_at=?", (self._now(),))
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    @staticmethod
+    def _to_text(value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat(timespec="seconds") if value else None
+
+    @staticmethod
+    def _row_to_task(row) -> Task:
+        created_at = datetime.fromisoformat(row[5]) if row[5] else None
+        due_at = datetime.fromisoformat(row[6]) if row[6] else None
+        rule_id = uuid.UUID(row[9]) if row[9] else None
+        return Task(row[1], row[2], row[3], row[4], uuid.UUID(row[0]), created_at,
+                    due_at, bool(row[7]), bool(row[8]), rule_id)
+
+    @staticmethod
+    def _row_to_rule(row) -> RecurrenceRule:
+        return RecurrenceRule(row[1], row[2], row[3], row[4], datetime.fromisoformat(row[6]),
+                              row[5], uuid.UUID(row[0]))
 
     def get_tasks_by_quadrant(self, quadrant: str) -> List[Task]:
         try:
             cur = self.conn.cursor()
-            cur.execute("SELECT id, title, description, quadrant, status FROM tasks WHERE quadrant=?", (quadrant,))
+            cur.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE quadrant=?", (quadrant,))
             rows = cur.fetchall()
-            return [Task(row[1], row[2], row[3], row[4], uuid.UUID(row[0])) for row in rows]
+            return [self._row_to_task(row) for row in rows]
         except Exception as e:
             logging.error(f"Error reading tasks: {e}")
             return []
@@ -117,44 +361,264 @@ class TaskManager:
     def get_all_tasks(self) -> List[Task]:
         try:
             cur = self.conn.cursor()
-            cur.execute("SELECT id, title, description, quadrant, status FROM tasks")
+            cur.execute(f"SELECT {self.COLUMNS} FROM tasks")
             rows = cur.fetchall()
-            return [Task(row[1], row[2], row[3], row[4], uuid.UUID(row[0])) for row in rows]
+            return [self._row_to_task(row) for row in rows]
         except Exception as e:
             logging.error(f"Error reading all tasks: {e}")
             return []
 
+    def get_task(self, task_id: uuid.UUID) -> Optional[Task]:
+        try:
+            cur = self.conn.cursor()
+            cur.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE id=?", (str(task_id),))
+            row = cur.fetchone()
+            return self._row_to_task(row) if row else None
+        except Exception as e:
+            logging.error(f"Error reading task: {e}")
+            return None
+
+    def _insert_task(self, task: Task):
+        self.conn.execute(
+            f"INSERT INTO tasks ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(task.id), task.title, task.description, task.quadrant, task.status,
+             self._to_text(task.created_at), self._to_text(task.due_at),
+             int(task.reminded), int(task.promoted), str(task.rule_id) if task.rule_id else None)
+        )
+
     def add_task(self, task: Task):
         try:
             with self.conn:
-                self.conn.execute(
-                    "INSERT INTO tasks (id, title, description, quadrant, status) VALUES (?, ?, ?, ?, ?)",
-                    (str(task.id), task.title, task.description, task.quadrant, task.status)
-                )
+                self._insert_task(task)
             signals.tasks_changed.emit()
         except Exception as e:
             logging.error(f"Error adding task: {e}")
             QMessageBox.critical(None, "خطا", "امکان افزودن وظیفه وجود ندارد.")
 
+    def _update_row(self, task: Task):
+        self.conn.execute(
+            "UPDATE tasks SET title=?, description=?, quadrant=?, status=?, "
+            "due_at=?, reminded=?, promoted=? WHERE id=?",
+            (task.title, task.description, task.quadrant, task.status,
+             self._to_text(task.due_at), int(task.reminded), int(task.promoted), str(task.id))
+        )
+
     def update_task(self, task: Task):
         try:
             with self.conn:
-                self.conn.execute(
-                    "UPDATE tasks SET title=?, description=?, quadrant=?, status=? WHERE id=?",
-                    (task.title, task.description, task.quadrant, task.status, str(task.id))
-                )
+                self._update_row(task)
             signals.tasks_changed.emit()
         except Exception as e:
             logging.error(f"Error updating task: {e}")
 
     def delete_task(self, task_id: uuid.UUID):
+        """Delete a task; for a recurring task this also ends its series."""
         try:
             with self.conn:
+                # Deleting the live occurrence of a series ends the series
+                self.conn.execute(
+                    "DELETE FROM recurrence_rules WHERE id=(SELECT rule_id FROM tasks WHERE id=?)",
+                    (str(task_id),)
+                )
                 self.conn.execute("DELETE FROM tasks WHERE id=?", (str(task_id),))
             signals.tasks_changed.emit()
         except Exception as e:
             logging.error(f"Error deleting task: {e}")
 
+    def complete_task(self, task: Task):
+        """Mark a task Done and archive it in one transaction and one refresh."""
+        task.status = "Done"
+        try:
+            with self.conn:
+                self._update_row(task)
+                if task.rule_id:
+                    self._insert_next_occurrence(task)
+                self._move_to_archive(ARCHIVE_AFTER_DAYS)
+            signals.tasks_changed.emit()
+        except Exception as e:
+            logging.error(f"Error completing task: {e}")
+
+    # -------------------- Recurrence --------------------
+    def add_recurring_task(self, rule: RecurrenceRule):
+        try:
+            with self.conn:
+                self.conn.execute(
+                    f"INSERT INTO recurrence_rules ({self.RULE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(rule.id), rule.title, rule.description, rule.quadrant, rule.frequency,
+                     rule.interval, self._to_text(rule.start_at))
+                )
+                task = rule.next_task()
+                # The user has just picked the quadrant, so respect it like a typed deadline
+                task.set_due(task.due_at)
+                self._insert_task(task)
+            signals.tasks_changed.emit()
+        except Exception as e:
+            logging.error(f"Error adding recurring task: {e}")
+            QMessageBox.critical(None, "خطا", "امکان افزودن وظیفه وجود ندارد.")
+
+    def update_series(self, task: Task, quadrant: Optional[str] = None):
+        """Copy an occurrence's title and description (and optionally a quadrant) to its rule."""
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE recurrence_rules SET title=?, description=?, quadrant=COALESCE(?, quadrant) WHERE id=?",
+                    (task.title, task.description, quadrant, str(task.rule_id))
+                )
+        except Exception as e:
+            logging.error(f"Error updating recurrence rule: {e}")
+
+    def get_rule(self, rule_id: uuid.UUID) -> Optional[RecurrenceRule]:
+        try:
+            cur = self.conn.cursor()
+            cur.execute(f"SELECT {self.RULE_COLUMNS} FROM recurrence_rules WHERE id=?", (str(rule_id),))
+            row = cur.fetchone()
+            return self._row_to_rule(row) if row else None
+        except Exception as e:
+            logging.error(f"Error reading recurrence rule: {e}")
+            return None
+
+    def _insert_next_occurrence(self, task: Task):
+        # Runs inside the caller's transaction
+        rule = self.get_rule(task.rule_id)
+        if rule is None:
+            return
+        # Never repeat this date, and skip occurrences missed while it was late
+        after = max(task.due_at or rule.start_at, datetime.now())
+        self._insert_task(rule.next_task(after))
+
+    def skip_occurrence(self, task: Task):
+        """Drop one occurrence of a series and move on to the next."""
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM tasks WHERE id=?", (str(task.id),))
+                self._insert_next_occurrence(task)
+            signals.tasks_changed.emit()
+        except Exception as e:
+            logging.error(f"Error skipping occurrence: {e}")
+
+    def materialize_rules(self):
+        """Give every series without a live task its next occurrence."""
+        try:
+            cur = self.conn.cursor()
+            cur.execute(
+                f"SELECT {self.RULE_COLUMNS} FROM recurrence_rules r "
+                f"WHERE NOT EXISTS (SELECT 1 FROM tasks t WHERE t.rule_id = r.id)"
+            )
+            rules = [self._row_to_rule(row) for row in cur.fetchall()]
+            if not rules:
+                return
+            now = datetime.now()
+            with self.conn:
+                for rule in rules:
+                    self._insert_task(rule.next_task(now))
+            signals.tasks_changed.emit()
+        except Exception as e:
+            logging.error(f"Error materializing recurring tasks: {e}")
+
+    # -------------------- Archive --------------------
+    def _move_to_archive(self, max_age_days: Optional[int]) -> int:
+        # Runs inside the caller's transaction; returns the number of rows moved
+        where = "status='Done'"
+        params = []
+        if max_age_days is not None:
+            # The live occurrence of a series stays; archiving it would leave the series empty
+            where += " OR (created_at < ? AND rule_id IS NULL)"
+            cutoff = datetime.now() - timedelta(days=max_age_days)
+            params.append(cutoff.isoformat(timespec="seconds"))
+        cur = self.conn.execute(
+            f"INSERT OR REPLACE INTO tasks_archive ({self.COLUMNS}, archived_at) "
+            f"SELECT {self.COLUMNS}, ? FROM tasks WHERE {where}",
+            [self._now()] + params
+        )
+        self.conn.execute(f"DELETE FROM tasks WHERE {where}", params)
+        return cur.rowcount
+
+    def archive_tasks(self, max_age_days: Optional[int] = ARCHIVE_AFTER_DAYS) -> int:
+        """Move Done tasks (and, if given, tasks older than max_age_days) to the archive."""
+        try:
+            with self.conn:
+                moved = self._move_to_archive(max_age_days)
+            if moved:
+                logging.info(f"Archived {moved} task(s)")
+                signals.tasks_changed.emit()
+            return moved
+        except Exception as e:
+            logging.error(f"Error archiving tasks: {e}")
+            return 0
+
+    def get_archived_tasks(self, offset: int = 0, limit: int = ARCHIVE_PAGE_SIZE) -> List[Task]:
+        try:
+            cur = self.conn.cursor()
+            cur.execute(
+                f"SELECT {self.COLUMNS} FROM tasks_archive ORDER BY archived_at DESC, rowid DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            )
+            return [self._row_to_task(row) for row in cur.fetchall()]
+        except Exception as e:
+            logging.error(f"Error reading archived tasks: {e}")
+            return []
+
+    def count_archived_tasks(self) -> int:
+        try:
+            return self.conn.execute("SELECT COUNT(*) FROM tasks_archive").fetchone()[0]
+        except Exception as e:
+            logging.error(f"Error counting archived tasks: {e}")
+            return 0
+
+    def restore_task(self, task_id: uuid.UUID) -> bool:
+        """Move an archived task back onto the board, reopening it if it was Done.
+
+        A restored occurrence is detached from its series, which already has
+        its own live occurrence.
+        """
+        try:
+            with self.conn:
+                self.conn.execute(
+                    f"INSERT INTO tasks ({self.COLUMNS}) "
+                    f"SELECT id, title, description, quadrant, "
+                    f"CASE status WHEN 'Done' THEN 'To Do' ELSE status END, ?, due_at, reminded, promoted, NULL "
+                    f"FROM tasks_archive WHERE id=?",
+                    (self._now(), str(task_id))
+                )
+                self.conn.execute("DELETE FROM tasks_archive WHERE id=?", (str(task_id),))
+            signals.tasks_changed.emit()
+            return True
+        except Exception as e:
+            logging.error(f"Error restoring task: {e}")
+            QMessageBox.critical(None, "خطا", "امکان بازگردانی وظیفه وجود ندارد.")
+            return False
+
+    # -------------------- Deadlines --------------------
+    def get_upcoming_deadlines(self) -> List[tuple]:
+        """Return (id, title, quadrant, due_at, reminded, promoted) for open tasks with a due date."""
+        try:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT id, title, quadrant, due_at, reminded, promoted FROM tasks "
+                "WHERE due_at IS NOT NULL AND status != 'Done' ORDER BY due_at"
+            )
+            return [(row[0], row[1], row[2], datetime.fromisoformat(row[3]), bool(row[4]), bool(row[5]))
+                    for row in cur.fetchall()]
+        except Exception as e:
+            logging.error(f"Error reading deadlines: {e}")
+            return []
+
+    def apply_due_tasks(self, promote_ids: List[str], remind_ids: List[str]) -> bool:
+        """Promote and mark as reminded in one transaction and one refresh."""
+        try:
+            with self.conn:
+                if promote_ids:
+                    marks = ", ".join("?" * len(promote_ids))
+                    self.conn.execute(f"UPDATE tasks SET quadrant='Q1', promoted=1 WHERE id IN ({marks})", promote_ids)
+                if remind_ids:
+                    marks = ", ".join("?" * len(remind_ids))
+                    self.conn.execute(f"UPDATE tasks SET reminded=1 WHERE id IN ({marks})", remind_ids)
+            signals.tasks_changed.emit()
+            return True
+        except Exception as e:
+            logging.error(f"Error applying due tasks: {e}")
+            return False
+
     def change_password(self, old_password: str, new_password: str):
         try:
             old_key = derive_db_key(old_password, self.salt)
@@ -168,6 +632,128 @@ class TaskManager:
             logging.error(f"Error changing password: {e}")
             raise
 
+    def migrate_profile(self, password: str, profile: ConnectionProfile):
+        """Re-encrypt the database into a new profile using sqlcipher_export."""
+        key_hex = derive_db_key(password, self.salt).hex()
+        tmp_path = self.migrating_db_path
+        closed = False
+        try:
+            # The open connection no longer knows the key, so check the password separately
+            check = sqlite.connect(str(self.db_path))
+            try:
+                check.execute(f"PRAGMA key = \"x'{key_hex}'\"")
+                self.profile.apply_format(check)
+                check.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            finally:
+                check.close()
+
+            tmp_path.unlink(missing_ok=True)
+            self.conn.execute(f"ATTACH DATABASE ? AS migrated KEY \"x'{key_hex}'\"", (str(tmp_path),))
+            profile.apply_format(self.conn, "migrated")
+            self.conn.execute("SELECT sqlcipher_export('migrated')")
+            self.conn.execute("DETACH DATABASE migrated")
+            profile.save(self.pending_profile_path)
+            self.conn.close()
+            closed = True
+            os.replace(tmp_path, self.db_path)
+            # The file is in the new format from here on; _recover_migration()
+            # finishes the profile swap if we die before the next line
+            self.profile = profile
+            os.replace(self.pending_profile_path, self.profile_path)
+        except Exception as e:
+            logging.error(f"Error migrating database profile: {e}")
+            if self.profile is not profile:
+                if not closed:
+                    try:
+                        self.conn.execute("DETACH DATABASE migrated")
+                    except Exception:
+                        pass
+                self.pending_profile_path.unlink(missing_ok=True)
+                tmp_path.unlink(missing_ok=True)
+            raise
+        finally:
+            if closed:
+                # Reopen with whichever profile now matches the file on disk
+                self.db_key = bytes.fromhex(key_hex)
+                self._connect()
+            del key_hex
+
+# -------------------- Scheduler --------------------
+class ReminderScheduler(QObject):
+    """Fires reminders and Q1 promotions from one min-heap and one timer.
+
+    The heap holds (when, kind, task_id, title) for every pending event and
+    is rebuilt whenever tasks change; the timer is only ever armed for the
+    earliest entry.
+    """
+    REMIND = "remind"
+    PROMOTE = "promote"
+    # Re-check at least this often so a suspended machine doesn't miss deadlines
+    MAX_WAIT = timedelta(hours=1)
+    RETRY_DELAY = timedelta(minutes=1)
+
+    reminders_due = Signal(list)
+
+    def __init__(self, task_manager: TaskManager, parent=None):
+        super().__init__(parent)
+        self.task_manager = task_manager
+        self.heap = []
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        signals.tasks_changed.connect(self.reschedule)
+        self.reschedule()
+
+    def reschedule(self):
+        heap = []
+        for task_id, title, quadrant, due_at, reminded, promoted in self.task_manager.get_upcoming_deadlines():
+            if not reminded:
+                heap.append((due_at, self.REMIND, task_id, title))
+            if AUTO_PROMOTE_TO_Q1 and quadrant != "Q1" and not promoted:
+                heap.append((due_at - URGENT_WINDOW, self.PROMOTE, task_id, title))
+        heapq.heapify(heap)
+        self.heap = heap
+        self._arm()
+
+    def _arm(self):
+        self.timer.stop()
+        if self.heap:
+            wait = min(self.heap[0][0] - datetime.now(), self.MAX_WAIT)
+            self.timer.start(max(0, int(wait.total_seconds() * 1000)))
+
+    def tick(self):
+        if QApplication.activeModalWidget() or QApplication.activePopupWidget():
+            # The refresh would delete the task card that owns the open dialog or menu
+            self.timer.start(int(self.RETRY_DELAY.total_seconds() * 1000))
+            return
+        now = datetime.now()
+        popped, promote, remind, titles = [], [], [], []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            popped.append(entry)
+            _, kind, task_id, title = entry
+            if kind == self.PROMOTE:
+                promote.append(task_id)
+            else:
+                remind.append(task_id)
+                titles.append(title)
+        applied = False
+        try:
+            if popped:
+                # On success this emits tasks_changed, which rebuilds the heap and re-arms the timer
+                applied = self.task_manager.apply_due_tasks(promote, remind)
+            else:
+                applied = True
+                self._arm()
+        finally:
+            if not applied:
+                # Put the events back and retry instead of stalling until the next edit
+                for entry in popped:
+                    heapq.heappush(self.heap, entry)
+                self.timer.start(int(self.RETRY_DELAY.total_seconds() * 1000))
+        if applied and titles:
+            self.reminders_due.emit(titles)
+
 # -------------------- Views --------------------
 class TaskWidget(QFrame):
     def __init__(self, task: Task, task_manager: TaskManager, parent=None):
@@ -214,6 +800,13 @@ class TaskWidget(QFrame):
             desc_label.setStyleSheet("font-size: 16px; color: #D0D0D0;")
             layout.addWidget(desc_label)
 
+        if task.due_at:
+            overdue = task.due_at <= datetime.now()
+            repeat = " ↻" if task.rule_id else ""
+            due_label = QLabel(f"سررسید: {task.due_at.strftime('%Y-%m-%d %H:%M')}{repeat}")
+            due_label.setStyleSheet(f"font-size: 15px; color: {'#FF6B6B' if overdue else '#A0C4FF'};")
+            layout.addWidget(due_label)
+
         layout.addStretch()
 
         status_label = QLabel(task.status)
@@ -246,10 +839,9 @@ class TaskWidget(QFrame):
 
     def mouseDoubleClickEvent(self, event):
         if event.button() == Qt.LeftButton:
+            # The dialog saves the task itself and triggers the refresh
             dialog = EditTaskDialog(self.task, self.task_manager, self)
-            if dialog.exec():
-                self.task_manager.update_task(self.task)
-                signals.tasks_changed.emit()
+            dialog.exec()
         super().mouseDoubleClickEvent(event)
 
     def contextMenuEvent(self, event):
@@ -262,9 +854,23 @@ class TaskWidget(QFrame):
                 color: #FFFFFF;
             }
         """)
+        done_action = menu.addAction("انجام شد")
         delete_action = menu.addAction("حذف وظیفه")
         action = menu.exec(event.globalPos())
-        if action == delete_action:
+        if action == done_action:
+            self.task_manager.complete_task(self.task)
+        elif action == delete_action and self.task.rule_id:
+            box = QMessageBox(QMessageBox.Question, "تأیید", "این وظیفه تکراری است. چه چیزی حذف شود؟",
+                              parent=self)
+            skip = box.addButton("فقط همین مورد", QMessageBox.AcceptRole)
+            end = box.addButton("پایان تکرار", QMessageBox.DestructiveRole)
+            box.addButton("لغو", QMessageBox.RejectRole)
+            box.exec()
+            if box.clickedButton() == skip:
+                self.task_manager.skip_occurrence(self.task)
+            elif box.clickedButton() == end:
+                self.task_manager.delete_task(self.task.id)
+        elif action == delete_action:
             reply = QMessageBox.question(self, "تأیید", "حذف شود؟", QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
                 self.task_manager.delete_task(self.task.id)
@@ -316,11 +922,10 @@ class DraggableListWidget(QListWidget):
             task_id_bytes = event.mimeData().data("application/x-task-id")
             task_id_str = bytes(task_id_bytes).decode('utf-8')
             task_id = uuid.UUID(task_id_str)
-            for task in self.task_manager.get_all_tasks():
-                if task.id == task_id:
-                    task.quadrant = self.quadrant
-                    self.task_manager.update_task(task)
-                    break
+            task = self.task_manager.get_task(task_id)
+            if task:
+                task.move_to(self.quadrant)
+                self.task_manager.update_task(task)
             event.acceptProposedAction()
             signals.tasks_changed.emit()
         self.dragLeaveEvent(event)
@@ -398,7 +1003,7 @@ class ModernDialog(QDialog):
                 border: 1px solid rgba(120, 180, 255, 100);
             }
             QLabel { color: #FFFFFF; font-size: 17px; font-weight: bold; }
-            QLineEdit, QComboBox {
+            QLineEdit, QComboBox, QDateTimeEdit {
                 background: rgba(50, 65, 95, 240);
                 color: #FFFFFF;
                 padding: 16px;
@@ -406,7 +1011,7 @@ class ModernDialog(QDialog):
                 border: 1px solid rgba(120, 180, 255, 120);
                 font-size: 16px;
             }
-            QLineEdit:focus, QComboBox:focus {
+            QLineEdit:focus, QComboBox:focus, QDateTimeEdit:focus {
                 border: 2px solid #78B4FF;
             }
             QPushButton {
@@ -421,6 +1026,34 @@ class ModernDialog(QDialog):
             QPushButton:pressed { background: #3A6BB5; }
         """)
 
+class DueDateField(QWidget):
+    def __init__(self, due_at: Optional[datetime] = None, parent=None):
+        super().__init__(parent)
+        self.initial = due_at
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.enabled = QCheckBox()
+        self.edit = QDateTimeEdit()
+        self.edit.setCalendarPopup(True)
+        self.edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+        # Default to just outside URGENT_WINDOW so a new deadline is not urgent yet
+        default = QDateTime.currentDateTime().addSecs(int((URGENT_WINDOW + timedelta(days=1)).total_seconds()))
+        self.edit.setDateTime(QDateTime(due_at) if due_at else default)
+        self.edit.setEnabled(due_at is not None)
+        self.enabled.setChecked(due_at is not None)
+        self.enabled.toggled.connect(self.edit.setEnabled)
+        layout.addWidget(self.enabled)
+        layout.addWidget(self.edit, 1)
+
+    def value(self) -> Optional[datetime]:
+        if not self.enabled.isChecked():
+            return None
+        value = self.edit.dateTime().toPython().replace(second=0, microsecond=0)
+        # The editor only shows minutes; an untouched deadline must compare equal
+        if self.initial and value == self.initial.replace(second=0, microsecond=0):
+            return self.initial
+        return value
+
 class AddTaskDialog(ModernDialog):
     def __init__(self, task_manager: TaskManager, parent=None):
         super().__init__("افزودن وظیفه جدید", parent)
@@ -437,10 +1070,17 @@ class AddTaskDialog(ModernDialog):
         self.desc.setPlaceholderText("توضیحات اختیاری...")
         self.quadrant = QComboBox()
         self.quadrant.addItems(["Q1 - فوری و مهم", "Q2 - مهم اما غیرفوری", "Q3 - فوری اما غیرمهم", "Q4 - غیرفوری و غیرمهم"])
+        self.due = DueDateField()
+        self.repeat = QComboBox()
+        self.repeat.addItem("بدون تکرار", None)
+        for key, label in RecurrenceRule.FREQUENCIES.items():
+            self.repeat.addItem(label, key)
 
         form.addRow("عنوان:", self.title)
         form.addRow("توضیحات:", self.desc)
         form.addRow("ربع:", self.quadrant)
+        form.addRow("سررسید:", self.due)
+        form.addRow("تکرار:", self.repeat)
         layout.addLayout(form)
 
         buttons = QHBoxLayout()
@@ -459,8 +1099,19 @@ class AddTaskDialog(ModernDialog):
             QMessageBox.warning(self, "خطا", "عنوان الزامی است")
             return
         q = self.quadrant.currentText().split(" - ")[0]
-        task = Task(title, self.desc.text(), q)
-        self.task_manager.add_task(task)
+        frequency = self.repeat.currentData()
+        if frequency:
+            start_at = self.due.value()
+            rule = RecurrenceRule(title, self.desc.text(), q, frequency,
+                                  start_at or datetime.now().replace(second=0, microsecond=0))
+            if start_at is None:
+                # Without a due date the series starts one interval from now, not already due
+                rule.start_at = next(rule.occurrences(rule.start_at))
+            self.task_manager.add_recurring_task(rule)
+        else:
+            task = Task(title, self.desc.text(), q)
+            task.set_due(self.due.value())
+            self.task_manager.add_task(task)
         self.accept()
 
 class EditTaskDialog(ModernDialog):
@@ -481,10 +1132,20 @@ class EditTaskDialog(ModernDialog):
         self.quadrant = QComboBox()
         self.quadrant.addItems(["Q1 - فوری و مهم", "Q2 - مهم اما غیرفوری", "Q3 - فوری اما غیرمهم", "Q4 - غیرفوری و غیرمهم"])
         self.quadrant.setCurrentText(f"{task.quadrant} - {['فوری و مهم','مهم اما غیرفوری','فوری اما غیرمهم','غیرفوری و غیرمهم'][int(task.quadrant[1])-1]}")
+        self.status = QComboBox()
+        self.status.addItems(STATUSES)
+        self.status.setCurrentText(task.status)
+        self.due = DueDateField(task.due_at)
+        self.series = QCheckBox("اعمال بر همه تکرارهای بعدی")
+        self.series.setChecked(True)
 
         form.addRow("عنوان:", self.title)
         form.addRow("توضیحات:", self.desc)
         form.addRow("ربع:", self.quadrant)
+        form.addRow("وضعیت:", self.status)
+        form.addRow("سررسید:", self.due)
+        if task.rule_id:
+            form.addRow("تکرار:", self.series)
         layout.addLayout(form)
 
         buttons = QHBoxLayout()
@@ -503,12 +1164,100 @@ class EditTaskDialog(ModernDialog):
             QMessageBox.warning(self, "خطا", "عنوان الزامی است")
             return
         q = self.quadrant.currentText().split(" - ")[0]
+        moved = q != self.task.quadrant
         self.task.title = title
         self.task.description = self.desc.text()
-        self.task.quadrant = q
-        self.task_manager.update_task(self.task)
+        due_at = self.due.value()
+        if due_at != self.task.due_at:
+            self.task.set_due(due_at)
+        self.task.move_to(q)
+        if self.task.rule_id and self.series.isChecked():
+            # Only a quadrant the user picked goes to the rule, not one from auto-promotion
+            self.task_manager.update_series(self.task, q if moved else None)
+        if self.status.currentText() == "Done":
+            self.task_manager.complete_task(self.task)
+        else:
+            self.task.status = self.status.currentText()
+            self.task_manager.update_task(self.task)
         self.accept()
 
+class ArchiveDialog(ModernDialog):
+    def __init__(self, task_manager: TaskManager, parent=None):
+        super().__init__("بایگانی وظایف", parent)
+        self.task_manager = task_manager
+        self.setMinimumSize(700, 600)
+        self.loaded = 0
+        self.total = task_manager.count_archived_tasks()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(50, 50, 50, 50)
+        layout.setSpacing(30)
+
+        self.count = QLabel()
+        layout.addWidget(self.count)
+
+        self.list = QListWidget()
+        self.list.setStyleSheet("""
+            QListWidget {
+                background: rgba(50, 65, 95, 240);
+                color: #FFFFFF;
+                border-radius: 18px;
+                border: 1px solid rgba(120, 180, 255, 120);
+                font-size: 16px;
+                padding: 10px;
+            }
+            QListWidget::item { padding: 10px; }
+            QListWidget::item:selected { background: rgba(120, 180, 255, 120); border-radius: 12px; }
+        """)
+        # Pages are fetched only as the user scrolls to the end of the list
+        self.list.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        layout.addWidget(self.list)
+
+        buttons = QHBoxLayout()
+        restore = QPushButton("بازگردانی")
+        close = QPushButton("بستن")
+        restore.clicked.connect(self.restore_selected)
+        close.clicked.connect(self.accept)
+        buttons.addStretch()
+        buttons.addWidget(restore)
+        buttons.addWidget(close)
+        layout.addLayout(buttons)
+
+        self.load_more()
+
+    def load_more(self):
+        if self.loaded >= self.total:
+            return
+        tasks = self.task_manager.get_archived_tasks(self.loaded, ARCHIVE_PAGE_SIZE)
+        for task in tasks:
+            item = QListWidgetItem(f"{task.quadrant} · {task.title}")
+            item.setData(Qt.UserRole, str(task.id))
+            if task.description:
+                item.setToolTip(task.description)
+            self.list.addItem(item)
+        self.loaded += len(tasks)
+        if not tasks:
+            self.total = self.loaded
+        self.count.setText(f"{self.total} وظیفه در بایگانی")
+
+    def on_scroll(self, value):
+        if value >= self.list.verticalScrollBar().maximum():
+            self.load_more()
+
+    def restore_selected(self):
+        item = self.list.currentItem()
+        if item is None:
+            return
+        if not self.task_manager.restore_task(uuid.UUID(item.data(Qt.UserRole))):
+            return
+        self.list.takeItem(self.list.row(item))
+        self.loaded -= 1
+        self.total -= 1
+        self.count.setText(f"{self.total} وظیفه در بایگانی")
+        # Without a scrollbar there is no scroll event left to fetch the next page
+        if self.list.verticalScrollBar().maximum() == 0:
+            self.load_more()
+
 class ChangePasswordDialog(ModernDialog):
     def __init__(self, task_manager: TaskManager, parent=None):
         super().__init__("تغییر رمز عبور", parent)
@@ -630,6 +1379,9 @@ class LoginDialog(ModernDialog):
                 self.password = password
                 self.accept()
                 return
+            except DatabaseInUseError:
+                QMessageBox.warning(self, "خطا", "این حساب در برنامه دیگری باز است.")
+                return
             except:
                 QMessageBox.critical(self, "خطا", "خطا در ایجاد کاربر جدید.")
                 return
@@ -640,6 +1392,8 @@ class LoginDialog(ModernDialog):
             self.username = username
             self.password = password
             self.accept()
+        except DatabaseInUseError:
+            QMessageBox.warning(self, "خطا", "این حساب در برنامه دیگری باز است.")
         except:
             QMessageBox.critical(self, "خطا", "نام کاربری یا رمز عبور اشتباه است.")
 
@@ -658,6 +1412,10 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(f"EisenFlow – {username}")
         self.setMinimumSize(1600, 900)
         self.task_manager = TaskManager(username, password)
+        self.task_manager.archive_tasks()
+        self.task_manager.materialize_rules()
+        self.scheduler = ReminderScheduler(self.task_manager, self)
+        self.scheduler.reminders_due.connect(self.show_reminders)
 
         bg = BackgroundWidget()
         self.setCentralWidget(bg)
@@ -696,13 +1454,21 @@ class MainWindow(QMainWindow):
 
         change.clicked.connect(lambda: ChangePasswordDialog(self.task_manager, self).exec())
 
+        archive = QPushButton("بایگانی")
+        archive.setStyleSheet(add.styleSheet().replace("#64B5FF", "#ADB5BD").replace("#4787D9", "#868E96"))
+        archive.clicked.connect(lambda: ArchiveDialog(self.task_manager, self).exec())
+
         toolbar.addStretch()
         toolbar.addWidget(add)
         toolbar.addWidget(change)
+        toolbar.addWidget(archive)
         toolbar.addStretch()
 
         grid.addLayout(toolbar, 2, 0, 1, 2, Qt.AlignCenter)
 
+    def show_reminders(self, titles: List[str]):
+        QMessageBox.information(self, "یادآوری", "سررسید این وظایف رسیده است:\n\n" + "\n".join(titles))
+
     def closeEvent(self, event):
         self.task_manager.close()
         super().closeEvent(event)
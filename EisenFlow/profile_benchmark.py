@@ -0,0 +1,138 @@
+"""Measure SQLCipher connection profiles and save the fastest as the default.
+
+Run with `python profile_benchmark.py`. Every candidate gets a throwaway
+encrypted database filled the way TaskManager fills one: single-row
+commits for writes and per-quadrant selects on a fresh connection for
+reads. The winner is written to DEFAULT_PROFILE_FILE, which new users'
+databases pick up.
+
+Only the file-format settings are swept. cache_size stays at the built-in
+default: on a fresh connection to a task database every page fits in the
+smallest cache, so a sweep would only rank noise.
+
+Existing databases keep their profile until migrated:
+`python profile_benchmark.py --migrate <username>` re-encrypts that user's
+database into the saved default profile. The app must be closed first;
+migration refuses to run while it holds the user's lock file.
+"""
+import argparse
+import getpass
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from itertools import product
+from pathlib import Path
+
+from sqlcipher3 import dbapi2 as sqlite
+
+from main import (
+    ConnectionProfile, DEFAULT_PROFILE_FILE, DatabaseInUseError, TaskManager, USERS_DIR, default_profile
+)
+
+PAGE_SIZES = [1024, 4096, 8192, 16384]
+HMAC_ALGORITHMS = ["HMAC_SHA512", "HMAC_SHA256"]
+TASK_COUNT = 2000
+READ_ROUNDS = 20
+REPEATS = 3
+# A candidate must beat the built-in profile by this much to replace it
+MIN_GAIN = 1.10
+
+def _open(path: Path, key_hex: str, profile: ConnectionProfile):
+    conn = sqlite.connect(str(path))
+    conn.execute(f"PRAGMA key = \"x'{key_hex}'\"")
+    profile.apply(conn)
+    return conn
+
+def measure(profile: ConnectionProfile, workdir: Path) -> tuple:
+    """Return (writes per second, reads per second) for one profile."""
+    path = workdir / f"{uuid.uuid4()}.db"
+    key_hex = os.urandom(32).hex()
+    conn = _open(path, key_hex, profile)
+    with conn:
+        conn.execute("""
+            CREATE TABLE tasks (
+                id TEXT PRIMARY KEY, title TEXT NOT NULL, description TEXT,
+                quadrant TEXT NOT NULL, status TEXT NOT NULL, created_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX idx_tasks_quadrant ON tasks (quadrant)")
+
+    start = time.perf_counter()
+    for i in range(TASK_COUNT):
+        with conn:
+            conn.execute(
+                "INSERT INTO tasks VALUES (?, ?, ?, ?, 'To Do', '2025-01-01T00:00:00')",
+                (str(uuid.uuid4()), f"Task {i}", "x" * 120, f"Q{i % 4 + 1}")
+            )
+    writes = TASK_COUNT / (time.perf_counter() - start)
+    conn.close()
+
+    start = time.perf_counter()
+    for _ in range(READ_ROUNDS):
+        conn = _open(path, key_hex, profile)
+        for q in ("Q1", "Q2", "Q3", "Q4"):
+            conn.execute("SELECT * FROM tasks WHERE quadrant=?", (q,)).fetchall()
+        conn.close()
+    reads = READ_ROUNDS * TASK_COUNT / (time.perf_counter() - start)
+    path.unlink()
+    return writes, reads
+
+def score(writes: float, reads: float) -> float:
+    # Geometric mean so neither side can win by sacrificing the other
+    return math.sqrt(writes * reads)
+
+def benchmark():
+    baseline = ConnectionProfile()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_size, hmac in product(PAGE_SIZES, HMAC_ALGORITHMS):
+            profile = ConnectionProfile(page_size=page_size, hmac_algorithm=hmac)
+            runs = [measure(profile, Path(tmp)) for _ in range(REPEATS)]
+            writes = statistics.median(r[0] for r in runs)
+            reads = statistics.median(r[1] for r in runs)
+            results.append((profile, writes, reads))
+            print(f"page={page_size:>5} {hmac:<11} "
+                  f"writes/s={writes:>9.0f} rows read/s={reads:>10.0f}")
+
+    base_score = next(score(w, r) for p, w, r in results
+                      if p.page_size == baseline.page_size and p.hmac_algorithm == baseline.hmac_algorithm)
+    best, writes, reads = max(results, key=lambda r: score(r[1], r[2]))
+    if score(writes, reads) < base_score * MIN_GAIN:
+        print(f"\nNo profile beat the built-in one by {MIN_GAIN - 1:.0%}; keeping it")
+        best = baseline
+    best.save(DEFAULT_PROFILE_FILE)
+    print(f"\nSaved page={best.page_size} {best.hmac_algorithm} to {DEFAULT_PROFILE_FILE}")
+
+def migrate(username: str):
+    if not (USERS_DIR / f"{username}.db").exists():
+        sys.exit(f"No database for user '{username}'")
+    password = getpass.getpass(f"Password for {username}: ")
+    try:
+        task_manager = TaskManager(username, password)
+    except DatabaseInUseError:
+        sys.exit(f"'{username}' is open in EisenFlow; close the app and try again")
+    except Exception:
+        sys.exit("Wrong password")
+    profile = default_profile()
+    try:
+        task_manager.migrate_profile(password, profile)
+    finally:
+        task_manager.close()
+    print(f"Migrated {username} to page={profile.page_size} {profile.hmac_algorithm}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--migrate", metavar="USERNAME",
+                        help="re-encrypt USERNAME's database into the saved default profile")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate(args.migrate)
+    else:
+        benchmark()
+
+if __name__ == "__main__":
+    main()